@@ -1,12 +1,92 @@
+import io
+
 import folium
+import matplotlib.pyplot as plt
 import pandas as pd
 import streamlit as st
-from src.plotting import plot_daily_summary_interactive, plot_weather_custom
-from src.utils import (estimate_next_dry_day, get_road_surface, is_road_dry,
+from src.plotting import (plot_daily_summary_interactive,
+                          plot_weather_interactive)
+from src.utils import (OverpassUnavailableError, estimate_next_dry_day,
+                       get_road_surface, is_road_dry,
                        plot_road_status_calendar_multi, road_status_per_day)
 from src.weather_data import get_weather_data
 from streamlit_folium import st_folium
 
+
+# Shown when Overpass can't answer; never cached, so the next rerun retries
+ROAD_SURFACE_UNAVAILABLE = "unknown (Overpass busy)"
+
+
+# --- Cached data access ---
+# `now` is the UTC hour, the same bucket get_weather_data memoizes on, so both
+# in-process caches roll over together and follow the plots' reference time
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_weather(lat, lon, days, now):
+    return get_weather_data(lat, lon, past_days=days)
+
+
+@st.cache_data(ttl=7 * 24 * 60 * 60, show_spinner=False)
+def _cached_road_surface(lat, lon):
+    return get_road_surface(lat, lon)
+
+
+# Built per render: st_folium rewrites the map's element ids, so a cached
+# folium.Map would be shared (and mutated) across sessions
+def _build_map(lat, lon, zoom=14):
+    m = folium.Map(location=[lat, lon], zoom_start=zoom, prefer_canvas=True)
+    folium.Marker([lat, lon], tooltip="Ubicación seleccionada").add_to(m)
+    return m
+
+
+# --- Cached figures (pure functions of their input frames) ---
+@st.cache_data(ttl=15 * 60, max_entries=16, show_spinner=False)
+def _cached_daily_figure(daily_df, now):
+    return plot_daily_summary_interactive(daily_df, now=now)
+
+
+@st.cache_data(ttl=15 * 60, max_entries=16, show_spinner=False)
+def _cached_hourly_figure(hourly_df, now):
+    return plot_weather_interactive(hourly_df, now=now)
+
+
+# Matplotlib figures are stateful and not thread-safe, so cache the rendered PNG
+@st.cache_data(ttl=15 * 60, max_entries=16, show_spinner=False)
+def _cached_status_png(daily_df):
+    status_df = road_status_per_day(daily_df)
+    fig = plot_road_status_calendar_multi(status_df)
+    buf = io.BytesIO()
+    # Match st.pyplot's rendering: 200 dpi, stretched to the container width
+    fig.savefig(buf, format="png", dpi=200, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+# --- Independent UI blocks ---
+@st.fragment
+def _render_daily(fig_daily):
+    st.subheader("Daily Summary")
+    st.plotly_chart(fig_daily, use_container_width=True)
+
+
+@st.fragment
+def _render_status(status_png):
+    st.subheader("Historic Path Status")
+    st.image(status_png, use_container_width=True)
+
+
+@st.fragment
+def _render_hourly(fig):
+    st.subheader("Hourly Data (Custom Plot)")
+    st.plotly_chart(fig, use_container_width=True)
+
+
+@st.fragment
+def _render_map(lat, lon):
+    st.subheader("Location Map")
+    m = _build_map(lat, lon)
+    st_folium(m, width=700, height=500)
+
+
 # --- Init state ---
 if "weather_fetched" not in st.session_state:
     st.session_state.weather_fetched = False
@@ -32,14 +112,38 @@ days = st.slider("Days of past data", 1, 90, 30)
 # --- Button triggers data load ---
 if st.button("Get Weather"):
     st.session_state.weather_fetched = True
+    # An explicit click always rebuilds the results instead of reusing the last run
+    st.session_state.pop("last_key", None)
 
 # --- Main logic ---
 if st.session_state.weather_fetched:
-    hourly_df, daily_df = get_weather_data(lat, lon, past_days=days)
-    road_surface = get_road_surface(lat, lon)
+    # One reference time per rerun, rounded so cached figures stay valid within the hour
+    now = pd.Timestamp.utcnow().floor("h")
+
+    # Reuse the previous run's results while the inputs and the hour are unchanged
+    key = (lat, lon, days, now)
+    if st.session_state.get("last_key") == key and "cached" in st.session_state:
+        hourly_df, daily_df, road_surface, figs = st.session_state["cached"]
+    else:
+        hourly_df, daily_df = _cached_weather(lat, lon, days, now)
+        try:
+            road_surface = _cached_road_surface(lat, lon)
+        except OverpassUnavailableError:
+            road_surface = ROAD_SURFACE_UNAVAILABLE
+        figs = {
+            "daily": _cached_daily_figure(daily_df, now),
+            "status": _cached_status_png(daily_df),
+            "hourly": _cached_hourly_figure(hourly_df, now),
+        }
+        st.session_state["cached"] = (hourly_df, daily_df, road_surface, figs)
+        # Don't pin a failed surface lookup for the rest of the hour
+        st.session_state["last_key"] = key if road_surface != ROAD_SURFACE_UNAVAILABLE else None
+
     next_dry_day = None
 
-    if is_road_dry(daily_df) and road_surface == "unpaved":
+    if road_surface == ROAD_SURFACE_UNAVAILABLE:
+        st.warning("⚠️ No se pudo consultar el tipo de camino (Overpass ocupado). Probá de nuevo en unos minutos.")
+    elif is_road_dry(daily_df) and road_surface == "unpaved":
         st.success("✅ El camino de tierra está seco. Podés pasar.")
     elif road_surface != "unpaved":
         st.warning("⚠️ El camino no es de tierra. No se necesita estimación.")
@@ -52,23 +156,10 @@ if st.session_state.weather_fetched:
         formatted_date = next_dry_day.strftime("%A %d %B").capitalize()
         st.info(f"🟡 Se estima que estará transitable a partir de **{formatted_date}**.")
 
-    st.subheader("Daily Summary")
-    fig_daily = plot_daily_summary_interactive(daily_df)
-    st.plotly_chart(fig_daily, use_container_width=True)
-
-    st.subheader("Historic Path Status")
-    status_df = road_status_per_day(daily_df)
-    fig_status = plot_road_status_calendar_multi(status_df)
-    st.pyplot(fig_status)
-
-    st.subheader("Hourly Data (Custom Plot)")
-    fig = plot_weather_custom(hourly_df)
-    st.pyplot(fig)
-
-    st.subheader("Location Map")
-    m = folium.Map(location=[lat, lon], zoom_start=14)
-    folium.Marker([lat, lon], tooltip="Ubicación seleccionada").add_to(m)
-    st_folium(m, width=700, height=500)
+    _render_daily(figs["daily"])
+    _render_status(figs["status"])
+    _render_hourly(figs["hourly"])
+    _render_map(lat, lon)
 
 # --- Footer ---
 st.text("Created by uri zen")
@@ -1,17 +1,40 @@
 from datetime import datetime
 
+import matplotlib
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import pandas as pd
 
+# Headless rendering: no GUI backend or event loop on the server. pyplot
+# resolves its backend lazily, so switching after the import is fine.
+matplotlib.use("Agg")
+plt.ioff()
 
-def plot_weather_custom(df: pd.DataFrame):
+
+def _downsample_hourly(df: pd.DataFrame, max_points: int = (60 + 7) * 24, freq: str = "3h") -> pd.DataFrame:
+    """
+    Bin long hourly frames (over ~60 past days plus the 7-day forecast) into coarser
+    steps so the matplotlib plot draws fewer points. Temperature and humidity are
+    averaged; rain keeps each bin's hourly peak so spikes still show at full height.
+    Frames with at most `max_points` rows are returned unchanged.
+    """
+    if len(df) <= max_points:
+        return df
+    numeric = df.set_index("date").select_dtypes("number")
+    agg = {c: "max" if c in ("rain", "precipitation") else "mean" for c in numeric.columns}
+    return numeric.resample(freq).agg(agg).reset_index()
+
+
+def plot_weather_custom(df: pd.DataFrame, now: pd.Timestamp | None = None):
     """
     Plot temperature, humidity and rain with 3 Y-axes and shaded background for forecast vs history.
 
     Args:
         df (pd.DataFrame): Hourly dataframe with 'date', 'temperature_2m', 'relative_humidity_2m', 'rain'
+        now (pd.Timestamp, optional): Boundary between history and forecast. Defaults to the current UTC time.
     """
+    df = _downsample_hourly(df)
+
     fig, ax1 = plt.subplots(figsize=(10, 5))
 
     ax2 = ax1.twinx()
@@ -38,7 +61,8 @@ def plot_weather_custom(df: pd.DataFrame):
     fig.autofmt_xdate()
 
     # 🎯 Shade background
-    now = pd.Timestamp.utcnow()
+    if now is None:
+        now = pd.Timestamp.utcnow()
     ax1.axvspan(df["date"].min(), now, facecolor="lightgray", alpha=0.3, label="Past")
     ax1.axvspan(now, df["date"].max(), facecolor="white", alpha=0.1, label="Forecast")
 
@@ -48,12 +72,13 @@ def plot_weather_custom(df: pd.DataFrame):
     plt.title("Weather Forecast: Temperature, Humidity, Rain")
     plt.tight_layout()
     return fig
-def plot_daily_summary(daily_df: pd.DataFrame):
+def plot_daily_summary(daily_df: pd.DataFrame, now: pd.Timestamp | None = None):
     """
     Plot daily temperature, humidity and rain with multi Y axes, shading past days and marking heavy rain.
 
     Args:
         daily_df (pd.DataFrame): Aggregated daily weather data
+        now (pd.Timestamp, optional): Current time; past days are shaded up to its day. Defaults to UTC now.
 
     Returns:
         matplotlib.figure.Figure
@@ -78,15 +103,17 @@ def plot_daily_summary(daily_df: pd.DataFrame):
     ax2.tick_params(axis="y", labelcolor="tab:blue")
     ax3.tick_params(axis="y", labelcolor="tab:green")
 
-    now = pd.Timestamp.utcnow().normalize()
+    if now is None:
+        now = pd.Timestamp.utcnow()
+    now = now.normalize()
 
     # ✅ Fondo gris hasta el día de hoy
     ax1.axvspan(dates.min(), now, facecolor="lightgray", alpha=0.3)
 
     # ✅ Línea vertical punteada en días con lluvia fuerte (> 10 mm)
-    for i, rain in enumerate(daily_df["rain"]):
-        if rain >= 10:
-            ax1.axvline(dates[i], color="purple", linestyle="--", linewidth=1)
+    heavy_rain = daily_df["rain"].to_numpy() >= 10
+    ax1.vlines(dates.to_numpy()[heavy_rain], 0, 1, transform=ax1.get_xaxis_transform(),
+               colors="purple", linestyles="--", linewidths=1)
 
     ax1.set_title("Daily Summary")
     fig.autofmt_xdate()
@@ -99,9 +126,10 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 
-def plot_daily_summary_interactive(daily_df: pd.DataFrame):
+def plot_daily_summary_interactive(daily_df: pd.DataFrame, now: pd.Timestamp | None = None):
     """
     Interactive Plotly version of daily summary with temperature, humidity and rain.
+    Past days are shaded up to the day of `now` (defaults to the current UTC time).
     Returns: Plotly Figure
     """
     fig = make_subplots(
@@ -112,7 +140,9 @@ def plot_daily_summary_interactive(daily_df: pd.DataFrame):
     )
 
     dates = pd.to_datetime(daily_df["date_day"])
-    now = pd.Timestamp.utcnow().normalize()
+    if now is None:
+        now = pd.Timestamp.utcnow()
+    now = now.normalize()
 
     # Shading for past days
     shade = dict(type="rect", xref="x", yref="paper",
@@ -120,33 +150,79 @@ def plot_daily_summary_interactive(daily_df: pd.DataFrame):
                  fillcolor="lightgray", opacity=0.3, layer="below", line_width=0)
 
     # Rain spike markers
+    heavy_rain = daily_df["rain"].to_numpy() >= 10
     rain_spikes = [
         dict(type="line", xref="x", yref="paper",
-             x0=dates[i], x1=dates[i], y0=0, y1=1,
+             x0=d, x1=d, y0=0, y1=1,
              line=dict(color="purple", width=1, dash="dash"))
-        for i, r in enumerate(daily_df["rain"]) if r >= 10
+        for d in dates.to_numpy()[heavy_rain]
     ]
 
     # Temperature
-    fig.add_trace(go.Scatter(x=dates, y=daily_df["temperature_2m"],
-                             mode="lines+markers", name="Temperature",
-                             line=dict(color="red")), row=1, col=1)
+    fig.add_trace(go.Scattergl(x=dates, y=daily_df["temperature_2m"],
+                               mode="lines+markers", name="Temperature",
+                               line=dict(color="red")), row=1, col=1)
 
     # Humidity
-    fig.add_trace(go.Scatter(x=dates, y=daily_df["relative_humidity_2m"],
-                             mode="lines+markers", name="Humidity",
-                             line=dict(color="blue")), row=2, col=1)
+    fig.add_trace(go.Scattergl(x=dates, y=daily_df["relative_humidity_2m"],
+                               mode="lines+markers", name="Humidity",
+                               line=dict(color="blue")), row=2, col=1)
 
     # Rain
-    fig.add_trace(go.Scatter(x=dates, y=daily_df["rain"],
-                             mode="lines+markers", name="Rain",
-                             line=dict(color="green")), row=3, col=1)
+    fig.add_trace(go.Scattergl(x=dates, y=daily_df["rain"],
+                               mode="lines+markers", name="Rain",
+                               line=dict(color="green")), row=3, col=1)
+
+    with fig.batch_update():
+        # Add shaded area and rain lines
+        fig.update_layout(shapes=[shade] + rain_spikes)
+
+        fig.update_layout(height=600, title_text="Daily Weather Summary", showlegend=False)
 
-    # Add shaded area and rain lines
-    fig.update_layout(shapes=[shade] + rain_spikes)
+        fig.update_xaxes(tickformat="%b %d", title="Date")
+
+    return fig
+
+
+def plot_weather_interactive(df: pd.DataFrame, now: pd.Timestamp | None = None):
+    """
+    Interactive Plotly version of the hourly plot with temperature, humidity and rain.
+    Hours before `now` (defaults to the current UTC time) are shaded.
+    Returns: Plotly Figure
+    """
+    fig = make_subplots(
+        rows=3, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.03,
+        subplot_titles=("Temperature (°C)", "Relative Humidity (%)", "Rain (mm)")
+    )
+
+    if now is None:
+        now = pd.Timestamp.utcnow()
+
+    # Shading for past hours
+    fig.add_shape(type="rect", xref="x", yref="paper",
+                  x0=df["date"].min(), x1=now, y0=0, y1=1,
+                  fillcolor="lightgray", opacity=0.3, layer="below", line_width=0)
+
+    # Temperature
+    fig.add_trace(go.Scattergl(x=df["date"], y=df["temperature_2m"],
+                               mode="lines", name="Temperature",
+                               line=dict(color="red")), row=1, col=1)
+
+    # Humidity
+    fig.add_trace(go.Scattergl(x=df["date"], y=df["relative_humidity_2m"],
+                               mode="lines", name="Humidity",
+                               line=dict(color="blue")), row=2, col=1)
+
+    # Rain
+    fig.add_trace(go.Scattergl(x=df["date"], y=df["rain"],
+                               mode="lines", name="Rain",
+                               line=dict(color="green")), row=3, col=1)
 
-    fig.update_layout(height=600, title_text="Daily Weather Summary", showlegend=False)
+    with fig.batch_update():
+        fig.update_layout(height=600, title_text="Weather Forecast: Temperature, Humidity, Rain", showlegend=False)
 
-    fig.update_xaxes(tickformat="%b %d", title="Date")
+        fig.update_xaxes(tickformat="%b %d", title="Date")
 
     return fig
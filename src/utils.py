@@ -1,12 +1,48 @@
 import calendar
+import functools
 from datetime import date
 
-import matplotlib.patches as mpatches
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
+import orjson
 import pandas as pd
 import requests
+import requests_cache
+from matplotlib.colors import ListedColormap
 from pandas import Timestamp
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# The calendar is rendered headless too (see src/plotting.py)
+matplotlib.use("Agg")
+plt.ioff()
+
+
+# Reused so repeated Overpass queries share one pooled connection, and cached
+# on disk since road surfaces rarely change. The queries are read-only, so
+# POSTs are safe to cache and retry.
+_OVERPASS_SESSION = requests_cache.CachedSession(
+    '.overpass_cache', expire_after=30 * 24 * 60 * 60, allowable_methods=("GET", "POST"),
+    # Late-bound: the filter lives next to _query_road_surface below
+    filter_fn=lambda response: _is_complete_overpass_response(response)
+)
+_OVERPASS_SESSION.mount("http://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 502, 503, 504), allowed_methods=None)
+))
+
+# Road status values, stored as int8-backed categoricals
+_ROAD_STATUS_DTYPE = pd.CategoricalDtype(["Dry", "Mud"])
+
+# Calendar colour lookup table indexed by cell code:
+# 0 = no day, 1 = unknown status, 2 = Dry, 3 = Mud (category code + 2)
+_CALENDAR_LUT = ListedColormap(["white", "lightgray", "green", "red"])
+
+# Shared tick setup for every calendar month panel
+_WEEK_X = np.arange(7)
+_WEEK_Y = np.arange(6)
+_WEEKDAY_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 
 def is_road_dry(daily_df: pd.DataFrame) -> bool:
@@ -16,10 +52,16 @@ def is_road_dry(daily_df: pd.DataFrame) -> bool:
     Returns:
         bool: True if the road is dry, False if it's muddy
     """
-    last_days = daily_df.sort_values("date_day").tail(2)
-    rain_ok = (last_days["rain"] <= 5).all()
-    humidity_ok = (last_days["relative_humidity_2m"] <= 90).all()
-    return rain_ok and humidity_ok
+    dates = pd.to_datetime(daily_df["date_day"])
+    if dates.is_monotonic_increasing:
+        idx = np.arange(max(len(dates) - 2, 0), len(dates))
+    else:
+        # Pick the two latest days without sorting the whole frame
+        dates = dates.values.view("i8")
+        idx = np.argpartition(dates, -2)[-2:] if len(dates) > 2 else np.arange(len(dates))
+    rain = daily_df["rain"].to_numpy()[idx]
+    humidity = daily_df["relative_humidity_2m"].to_numpy()[idx]
+    return bool((rain <= 5).all() and (humidity <= 90).all())
 
 
 def road_status_per_day(daily_df: pd.DataFrame) -> pd.DataFrame:
@@ -36,28 +78,26 @@ def road_status_per_day(daily_df: pd.DataFrame) -> pd.DataFrame:
     """
     df = daily_df.copy()
     df["date_day"] = pd.to_datetime(df["date_day"])
-    df["road_status"] = "Dry"
-
-    df["heavy_rain"] = df["rain"] > 5
-    df["high_humidity"] = df["relative_humidity_2m"] > 90
-
-    is_muddy = False
-    days_since_rain = 99  # arbitrarily large to start
-
-    for i in range(len(df)):
-        if df.loc[i, "heavy_rain"]:
-            is_muddy = True
-            days_since_rain = 0
-            df.loc[i, "road_status"] = "Mud"
-        elif is_muddy:
-            days_since_rain += 1
-            if days_since_rain < 2 or df.loc[i, "high_humidity"]:
-                df.loc[i, "road_status"] = "Mud"
-            else:
-                is_muddy = False
-                df.loc[i, "road_status"] = "Dry"
-        else:
-            df.loc[i, "road_status"] = "Dry"
+
+    heavy_rain = df["rain"].to_numpy() > 5
+    high_humidity = df["relative_humidity_2m"].to_numpy() > 90
+
+    # Index of the most recent heavy rain at each day (-1 if none yet)
+    idx = np.arange(len(df))
+    last_rain = np.maximum.accumulate(np.where(heavy_rain, idx, -1))
+    days_since_rain = idx - last_rain
+
+    # From the second day after the rain on, mud only persists while every
+    # day since has been humid: count the non-humid days after day 1
+    not_humid = np.cumsum(~high_humidity)
+    day1 = np.clip(last_rain + 1, 0, max(len(df) - 1, 0))
+    dried_days = not_humid - not_humid[day1]
+
+    muddy = (last_rain >= 0) & ((days_since_rain < 2) | (dried_days == 0))
+
+    df["road_status"] = pd.Categorical.from_codes(muddy.astype(np.int8), dtype=_ROAD_STATUS_DTYPE)
+    df["heavy_rain"] = heavy_rain
+    df["high_humidity"] = high_humidity
 
     return df
 
@@ -78,6 +118,12 @@ def plot_road_status_calendar_multi(status_df: pd.DataFrame):
     status_df["month"] = status_df["date_day"].dt.month
     status_df["year"] = status_df["date_day"].dt.year
 
+    # Codes always follow ["Dry", "Mud"] (-1 = unknown status), whatever the
+    # column's own category order; shifted to _CALENDAR_LUT cells. get_indexer
+    # maps categorical columns through their categories, not per row.
+    status_codes = _ROAD_STATUS_DTYPE.categories.get_indexer(status_df["road_status"]).astype(np.int8)
+    status_df["cell_code"] = status_codes + 2
+
     unique_months = status_df[["year", "month"]].drop_duplicates().sort_values(["year", "month"])
 
     n_months = len(unique_months)
@@ -96,35 +142,24 @@ def plot_road_status_calendar_multi(status_df: pd.DataFrame):
 
         df_month = status_df[(status_df["year"] == y) & (status_df["month"] == m)]
         first_weekday, month_days = calendar.monthrange(y, m)
-        grid = np.full((6, 7), "", dtype=object)
-        status_dict = {}
-
-        for _, r in df_month.iterrows():
-            d = r["day"]
-            weekday = (r["date_day"].weekday())
-            week = (d + first_weekday - 1) // 7
-            grid[week, weekday] = str(d)
-            status_dict[str(d)] = r["road_status"]
-
-        ax.set_xticks(np.arange(7))
-        ax.set_yticks(np.arange(6))
-        ax.set_xticklabels(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
-        ax.set_yticklabels([])
+
+        days = df_month["day"].to_numpy()
+        weekdays = df_month["date_day"].dt.weekday.to_numpy()
+        weeks = (days + first_weekday - 1) // 7
+
+        code_grid = np.zeros((6, 7), dtype=np.int8)
+        code_grid[weeks, weekdays] = df_month["cell_code"].to_numpy()
+
+        ax.set(xticks=_WEEK_X, yticks=_WEEK_Y, xticklabels=_WEEKDAY_LABELS, yticklabels=[],
+               xlim=(0, 7), ylim=(6, 0))
         ax.tick_params(top=False, bottom=False, left=False, right=False)
         ax.grid(False)
 
-        for i in range(6):
-            for j in range(7):
-                day = grid[i, j]
-                if day != "":
-                    status = status_dict.get(day, "Desconocido")
-                    color = {"Dry": "green", "Mud": "red"}.get(status, "lightgray")
-                    rect = mpatches.Rectangle((j, i), 1, 1, facecolor=color, edgecolor="white")
-                    ax.add_patch(rect)
-                    ax.text(j + 0.5, i + 0.5, day, ha="center", va="center", color="white", fontsize=12)
-
-        ax.set_xlim(0, 7)
-        ax.set_ylim(6, 0)
+        # One mesh for all cells instead of a Rectangle per day
+        ax.pcolormesh(code_grid, cmap=_CALENDAR_LUT, vmin=0, vmax=3, edgecolors="white", linewidth=1)
+        for i, j, day in zip(weeks, weekdays, days):
+            ax.text(j + 0.5, i + 0.5, str(day), ha="center", va="center", color="white", fontsize=12)
+
         ax.set_title(f"{calendar.month_name[m]} {y}", fontsize=14)
 
     # Ocultar ejes vacíos si sobran
@@ -142,36 +177,64 @@ def estimate_next_dry_day(daily_df: pd.DataFrame) -> pd.Timestamp | None:
     Recorre el dataframe y devuelve el primer día (a partir de hoy)
     en el que se espera que el camino esté seco.
     """
-    today = pd.Timestamp.utcnow().date()
+    dates = pd.to_datetime(daily_df["date_day"]).dt.tz_localize(None).dt.normalize()
+    rain = daily_df["rain"].to_numpy()
+    humidity = daily_df["relative_humidity_2m"].to_numpy()
+    if not dates.is_monotonic_increasing:
+        order = np.argsort(dates.to_numpy(), kind="stable")
+        dates, rain, humidity = dates.iloc[order], rain[order], humidity[order]
+
+    today = pd.Timestamp.utcnow().normalize().tz_localize(None)
+
+    # Las fechas están ordenadas: saltear los días pasados con búsqueda binaria
+    start = dates.searchsorted(today)
+    mask = (rain[start:] <= 5) & (humidity[start:] <= 90)
 
-    for _, row in daily_df.iterrows():
-        # Convertir row["date_day"] a date si es necesario
-        if isinstance(row["date_day"], pd.Timestamp):
-            row_date = row["date_day"].date()
-        else:
-            row_date = row["date_day"]
+    if not mask.any():
+        return None
+    return dates.iloc[start + mask.argmax()]
 
-        # Comparar como datetime.date
-        if row_date >= today:
-            if row["rain"] <= 5 and row["relative_humidity_2m"] <= 90:
-                return pd.to_datetime(row_date)
 
-    return None
 
 
 
 
+class OverpassUnavailableError(RuntimeError):
+    """Overpass could not answer right now (busy, timed out or unreachable)."""
 
 
 def get_road_surface(lat, lon):
+    try:
+        return _query_road_surface(round(lat, 5), round(lon, 5))
+    except (requests.RequestException, orjson.JSONDecodeError) as exc:
+        # Timeouts, exhausted retries and non-JSON error pages
+        raise OverpassUnavailableError(str(exc)) from exc
+
+
+def _is_complete_overpass_response(response) -> bool:
+    # Overpass reports timeouts/memory limits as HTTP 200 with a "remark" and
+    # partial (often empty) elements; those must never be cached. This parses
+    # the body a second time (_query_road_surface parses it again), which is
+    # cheap for these small tag-only answers.
+    try:
+        return "remark" not in orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return False
+
+
+@functools.lru_cache(maxsize=2048)
+def _query_road_surface(lat, lon):
     overpass_url = "http://overpass-api.de/api/interpreter"
     query = f"""
     [out:json];
     way(around:15,{lat},{lon})[highway][surface];
     out tags;
     """
-    response = requests.post(overpass_url, data={"data": query})
-    data = response.json()
+    response = _OVERPASS_SESSION.post(overpass_url, data={"data": query}, timeout=(3.05, 10))
+    data = orjson.loads(response.content)
+    if "remark" in data:
+        # Raising also keeps the incomplete answer out of the lru_cache
+        raise OverpassUnavailableError(f"Overpass query incomplete: {data['remark']}")
 
     if data["elements"]:
         surface = data["elements"][0]["tags"].get("surface", "unknown")
@@ -1,13 +1,36 @@
+import functools
+import time
+
+import numpy as np
 import openmeteo_requests
 import pandas as pd
 import requests_cache
 from retry_requests import retry
 
+# Shared across calls so the SQLite cache and adapters are only set up once
+_CACHE_SESSION = requests_cache.CachedSession('.cache', expire_after=3600)
+_RETRY_SESSION = retry(_CACHE_SESSION, retries=5, backoff_factor=0.2)
+_OPENMETEO = openmeteo_requests.Client(session=_RETRY_SESSION)
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Requested hourly variables, in the order Open-Meteo returns them
+HOURLY_VARIABLES = [
+    "temperature_2m",
+    "precipitation_probability",
+    "precipitation",
+    "rain",
+    "relative_humidity_2m"
+]
+
 
 def get_weather_data(lat: float, lon: float, timezone: str = "America/Sao_Paulo", past_days: int = 30):
     """
     Fetch weather forecast from Open-Meteo API for a given location.
 
+    The request is sent with lat/lon rounded to 3 decimals (~100 m), and results
+    are memoized in-process per rounded location until the end of the current UTC hour.
+
     Args:
         lat (float): Latitude of the location.
         lon (float): Longitude of the location.
@@ -17,29 +40,53 @@ def get_weather_data(lat: float, lon: float, timezone: str = "America/Sao_Paulo"
     Returns:
         tuple[pd.DataFrame, pd.DataFrame]: (hourly_df, daily_df)
     """
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-    openmeteo = openmeteo_requests.Client(session=retry_session)
+    hour_bucket = int(time.time() // 3600)
+    hourly_df, daily_df = _fetch_weather_data(round(lat, 3), round(lon, 3), timezone, past_days, hour_bucket)
+    # Hand out copies so callers can't mutate the memoized frames
+    return hourly_df.copy(), daily_df.copy()
+
+
+def get_weather_data_many(latlons: list[tuple[float, float]], timezone: str = "America/Sao_Paulo",
+                          past_days: int = 30):
+    """
+    Fetch weather forecasts for several locations in a single Open-Meteo request.
+
+    Args:
+        latlons (list[tuple[float, float]]): (lat, lon) pairs of the locations.
+        timezone (str): Timezone string.
+        past_days (int): Number of past days to include.
+
+    Returns:
+        list[tuple[pd.DataFrame, pd.DataFrame]]: (hourly_df, daily_df) per location, in input order
+    """
+    if not latlons:
+        return []
 
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
+    params = _forecast_params([lat for lat, _ in latlons], [lon for _, lon in latlons], timezone, past_days)
+    responses = _OPENMETEO.weather_api(FORECAST_URL, params=params)
+    return [_response_to_frames(response) for response in responses]
+
+
+@functools.lru_cache(maxsize=64)
+def _fetch_weather_data(lat: float, lon: float, timezone: str, past_days: int, hour_bucket: int):
+    # hour_bucket is only part of the cache key, so entries expire every hour
+    responses = _OPENMETEO.weather_api(FORECAST_URL, params=_forecast_params(lat, lon, timezone, past_days))
+    return _response_to_frames(responses[0])
+
+
+def _forecast_params(lat, lon, timezone: str, past_days: int) -> dict:
+    # lat/lon may be lists: Open-Meteo then answers with one response per location
+    return {
         "latitude": lat,
         "longitude": lon,
-        "hourly": [
-            "temperature_2m",
-            "precipitation_probability",
-            "precipitation",
-            "rain",
-            "relative_humidity_2m"
-        ],
+        "hourly": HOURLY_VARIABLES,
         "current": "rain",
         "timezone": timezone,
         "past_days": past_days
     }
 
-    responses = openmeteo.weather_api(url, params=params)
-    response = responses[0]
 
+def _response_to_frames(response):
     hourly = response.Hourly()
     time_index = pd.date_range(
         start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
@@ -48,24 +95,25 @@ def get_weather_data(lat: float, lon: float, timezone: str = "America/Sao_Paulo"
         inclusive="left"
     )
 
-    hourly_df = pd.DataFrame({
-        "date": time_index,
-        "temperature_2m": hourly.Variables(0).ValuesAsNumpy(),
-        "precipitation_probability": hourly.Variables(1).ValuesAsNumpy(),
-        "precipitation": hourly.Variables(2).ValuesAsNumpy(),
-        "rain": hourly.Variables(3).ValuesAsNumpy(),
-        "relative_humidity_2m": hourly.Variables(4).ValuesAsNumpy()
-    })
-
-    # Daily summary
-    hourly_df["date_day"] = hourly_df["date"].dt.date
-    daily_df = hourly_df.groupby("date_day").agg({
+    # Stack the variables row-wise so the transposed view handed to pandas
+    # becomes a single contiguous block without another copy. float32 is
+    # plenty for weather readings and halves the bytes the daily
+    # aggregation has to read.
+    values = np.vstack([
+        hourly.Variables(i).ValuesAsNumpy().astype(np.float32, copy=False)
+        for i in range(len(HOURLY_VARIABLES))
+    ])
+    hourly_df = pd.DataFrame(values.T, columns=HOURLY_VARIABLES, copy=False)
+    hourly_df.insert(0, "date", time_index)
+
+    # Daily summary, binned on the datetime index (UTC midnight timestamps)
+    daily_df = hourly_df.set_index("date").resample("D").agg({
         "temperature_2m": "mean",
         "relative_humidity_2m": "mean",
         "precipitation_probability": "mean",
         "precipitation": "sum",
         "rain": "sum"
-    }).reset_index()
+    }).reset_index().rename(columns={"date": "date_day"})
 
     return hourly_df, daily_df
 